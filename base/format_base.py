@@ -1,4 +1,5 @@
 import json
+import re
 import unicodedata
 
 def cleanse_text(text):
@@ -55,6 +56,11 @@ with open(file_path, 'r', encoding='utf-8') as f:
 data['header'] = cleanse_text(data['header'])
 cleanse_json_content(data['content'])
 
+# Record the guideline edition (e.g. "第3版") so that several editions can be checked side by side
+edition = re.search(r'第\d+版', data['header'])
+if edition:
+    data['version'] = edition.group(0)
+
 # Save the final cleansed data to a new JSON file
 output_path = 'base_after.json'
 with open(output_path, 'w', encoding='utf-8') as f:
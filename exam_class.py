@@ -1,85 +1,296 @@
 
 import re
+import os
 import unicodedata
 import json
+import functools
+import heapq
+import codecs
+import contextlib
 
 # pdfからテキストを抽出するためのライブラリ
 import fitz  # PyMuPDF
-import tempfile
 from timeout_decorator import timeout, TimeoutError
 
 # webサイトからテキストを抽出するためのライブラリ
 import requests
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+import urllib.robotparser
+from urllib.parse import urljoin, urlparse, urlunparse, urldefrag, unquote
+
+# 遵守宣言のページらしさを判定するキーワード（URLやリンク文字列に含まれていれば優先して巡回する）
+DECLARATION_KEYWORDS = ['遵守', '宣言', 'ガイドライン', 'guideline', 'declaration', 'compliance', 'sengen', 'junshu']
+
+# 内容の種類の判定に使う先頭のバイト数
+SNIFF_SIZE = 8192
+
+# 種類ごとのレスポンスの最大バイト数（超えた時点で取得を打ち切る）
+MAX_BYTES = {
+    'html': 5 * 1024 * 1024,
+    'pdf': 30 * 1024 * 1024,
+    'robots': 512 * 1024,
+    'sitemap': 10 * 1024 * 1024,
+}
+
+# 1回の巡回で読み込むサイトマップ数の上限（サイトマップインデックスの子を含む）
+MAX_SITEMAPS = 5
+
+# 本文を取得せずに審査対象外とするContent-Type
+SKIP_CONTENT_TYPES = (
+    'image/', 'audio/', 'video/', 'font/',
+    'application/zip', 'application/x-zip-compressed', 'application/gzip', 'application/x-tar',
+    'application/x-rar-compressed', 'application/x-7z-compressed',
+    'application/msword', 'application/vnd.',
+)
+
+# 信用しないContent-Typeのcharset
+WEAK_CHARSETS = ['iso-8859-1', 'latin-1', 'latin1', 'us-ascii', 'ascii']
+
+# 日本語の文字コード名の読み替え（Shift_JISは機種依存文字を含むcp932として扱う）
+ENCODING_ALIASES = {
+    'shift_jis': 'cp932',
+    'shift-jis': 'cp932',
+    'sjis': 'cp932',
+    'x-sjis': 'cp932',
+    'windows-31j': 'cp932',
+    'euc-jp': 'euc_jp',
+    'x-euc-jp': 'euc_jp',
+}
+
+
+class UnsupportedContentError(Exception):
+    """
+    審査対象外の種類（PDF、HTML以外）のレスポンス
+    """
+
+
+class ResponseTooLargeError(Exception):
+    """
+    最大バイト数を超えたため取得を打ち切ったレスポンス
+    """
+
+
+def iter_clauses(base_items):
+    """
+    base_itemsに含まれる条文（middle, small, small-small, asteriskの各階層を含む）を
+    (条文番号, 条文テキスト)の組として順に返す
+    """
+    for item in base_items:
+        # Check 'large' level content
+        number = item['large_number']
+        content_text = item['text']
+        yield number, content_text
+        
+        # Check 'middle' level content if it exists
+        if 'middle_content' in item:
+            for middle_item in item['middle_content']:
+                middle_number = middle_item['middle_number']
+                middle_text = middle_item['middle_text']
+                yield f"{number}.{middle_number}", middle_text
+                
+                # Check 'small' level content if it exists
+                if 'small_content' in middle_item:
+                    for small_item in middle_item['small_content']:
+                        if 'small_text' in small_item:
+                            small_number = small_item['small_number']
+                            small_text = small_item['small_text']
+                            yield f"{number}.{middle_number}.{small_number}", small_text
+                        
+                        # Check 'small-small' level content if it exists
+                        if 'small_small_content' in small_item:
+                            for small_small_item in small_item['small_small_content']:
+                                if 'small_small_text' in small_small_item:
+                                    small_small_number = small_small_item['small_small_number']
+                                    small_small_text = small_small_item['small_small_text']
+                                    yield f"{number}.{middle_number}.{small_number}.{small_small_number}", small_small_text
+        
+        # Check 'asterisk' content if it exists
+        if 'asterisk_content' in item:
+            for asterisk_item in item['asterisk_content']:
+                if 'asterisk_text' in asterisk_item:
+                    asterisk_number = asterisk_item['asterisk_number']
+                    asterisk_text = asterisk_item['asterisk_text']
+                    yield f"{number}*{asterisk_number}", asterisk_text
+
+        
+        # Check nested asterisk content in 'middle' level
+        if 'middle_content' in item:
+            for middle_item in item['middle_content']:
+                if 'asterisk_content' in middle_item:
+                    for asterisk_item in middle_item['asterisk_content']:
+                        if 'asterisk_text' in asterisk_item:
+                            asterisk_number = f"{number}.{middle_item['middle_number']}*{asterisk_item['asterisk_number']}"
+                            asterisk_text = asterisk_item['asterisk_text']
+                            yield asterisk_number, asterisk_text
+
+                # Check nested asterisk content in 'small' level
+                if 'small_content' in middle_item:
+                    for small_item in middle_item['small_content']:
+                        if 'asterisk_content' in small_item:
+                            for asterisk_item in small_item['asterisk_content']:
+                                if 'asterisk_text' in asterisk_item:
+                                    asterisk_number = f"{number}.{middle_item['middle_number']}.{small_item['small_number']}*{asterisk_item['asterisk_number']}"
+                                    asterisk_text = asterisk_item['asterisk_text']
+                                    yield asterisk_number, asterisk_text
+
+                        # Check nested asterisk content in 'small-small' level
+                        if 'small_small_content' in small_item:
+                            for small_small_item in small_item['small_small_content']:
+                                if 'asterisk_content' in small_small_item:
+                                    for asterisk_item in small_small_item['asterisk_content']:
+                                        if 'asterisk_text' in asterisk_item:
+                                            asterisk_number = f"{number}.{middle_item['middle_number']}.{small_item['small_number']}.{small_small_item['small_small_number']}*{asterisk_item['asterisk_number']}"
+                                            asterisk_text = asterisk_item['asterisk_text']
+                                            yield asterisk_number, asterisk_text
+
+
+class GuidelineIndex(object):
+    """
+    複数の版の遵守宣言原本（base/format_base.pyで作成したjson）をまとめた条文インデックス
+    ・versions: 版名のリスト（format_base.pyがヘッダーから書き込む"version"、なければファイル名）
+    ・clause_texts: 条文IDごとの条文テキスト（版をまたいで同じ文言の条文は同じIDを共有する）
+    ・header_ids: ヘッダーの条文IDの集合（プレースホルダーを含むため正規表現で比較する）
+    ・version_clauses: 版名ごとの(条文番号, 条文ID)のリスト（ヘッダーは条文番号0）
+    """
+    def __init__(self, base_json_paths):
+        self.versions = []
+        self.clause_texts = []
+        self.header_ids = set()
+        self.version_clauses = {}
+
+        clause_ids = {}
+
+        def clause_id_of(clause_text):
+            if clause_text not in clause_ids:
+                clause_ids[clause_text] = len(self.clause_texts)
+                self.clause_texts.append(clause_text)
+            return clause_ids[clause_text]
+
+        for json_path in base_json_paths:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                base_guideline = json.load(f)
+
+            version = base_guideline.get('version') or os.path.splitext(os.path.basename(json_path))[0]
+            if version in self.version_clauses:
+                raise ValueError(f"版名が重複しています: {version}")
+
+            header_id = clause_id_of(base_guideline['header'])
+            self.header_ids.add(header_id)
+            clauses = [(0, header_id)]
+            for number, content_text in iter_clauses(base_guideline['content']):
+                clauses.append((number, clause_id_of(content_text)))
+
+            self.versions.append(version)
+            self.version_clauses[version] = clauses
+
+    def missing_clause_ids(self, version, judges):
+        """
+        指定した版の条文のうち、judgesで記載なしとなっている条文IDのリストを返す
+        """
+        return [clause_id for _, clause_id in self.version_clauses[version] if not judges[clause_id]]
+
+    def missing_numbers(self, version, judges):
+        """
+        指定した版の条文のうち、judgesで記載なしとなっている条文番号のリストを返す
+        """
+        return [str(number) for number, clause_id in self.version_clauses[version] if not judges[clause_id]]
+
+
+class ClauseJudges(object):
+    """
+    1ページ分の条文ごとの審査結果
+    ・base_json_paths: 判定に用いた条文インデックスのjsonのパス
+    ・version: 判定に用いた版名
+    ・judges: 条文IDを添字とした判定結果（1: 記載あり、0: 記載なし）
+    条文番号や条文テキストは保持せず、必要な時にbase_json_pathsの条文インデックスから引く
+    """
+    __slots__ = ('base_json_paths', 'version', 'judges')
+
+    def __init__(self, base_json_paths, version, judges):
+        self.base_json_paths = tuple(base_json_paths)
+        self.version = version
+        self.judges = bytes(judges)
+
+    def missing_clause_ids(self):
+        return load_guideline_index(self.base_json_paths).missing_clause_ids(self.version, self.judges)
+
+    def missing_numbers(self):
+        return load_guideline_index(self.base_json_paths).missing_numbers(self.version, self.judges)
+
+
+@functools.lru_cache(maxsize=None)
+def load_guideline_index(base_json_paths):
+    """
+    条文インデックスを作成する。同じjsonの組み合わせはプロセス内で使い回す
+    """
+    return GuidelineIndex(base_json_paths)
+
 
 class ExamTargetClass(object):
     """
     コンストラクタ
     ・base_target_url: 審査対象のURL
-    ・base_json_path: 原本の遵守宣言のjsonファイルのパス
+    ・base_json_path: 原本の遵守宣言のjsonファイルのパス（移行期間中は複数の版のパスをリストで渡せる）
+    ・max_depth: 審査対象のリンクを探す際にベースURLから辿るクリック数の上限
+    ・max_pages: 審査対象のリンク数の上限
+    ・max_bytes: 種類（'html', 'pdf', 'robots', 'sitemap'）ごとのレスポンスの最大バイト数（指定しない種類はMAX_BYTESの値）
+    属性
+    ・fetch_stats: リクエスト数、受信したバイト数（raw_bytes）、展開後に読み込んだバイト数（decoded_bytes）、サイズ超過で打ち切った回数
     メソッド
     ・exam_execute: 審査を実行する
-    ・_is_PDF: URLがPDFかどうかを判定する
-    ・_crawl_web: URLからテキストを抽出する
+    ・_is_PDF: URLがPDFかどうかを拡張子で判定する
+    ・_crawl_web: 同一ホスト内を巡回し、遵守宣言の記載がありそうなURLを返す
+    ・_get_links_from_base: 同一ホスト内を巡回し、審査対象のリンクを返す
+    ・_extract_text: URLの内容の種類を判定し、PDFまたはHTMLからテキストを抽出する
+    ・_load_page: URLの内容を取得してテキストを抽出し、HTMLの場合は解析結果も返す（取得から抽出までを5秒で打ち切る）
+    ・_fetch_target: URLの内容をストリーミングで取得し、種類（PDF、HTML）と文字コードを判定する
+    ・_read_body: レスポンスの本文を上限バイト数まで読み込む
     ・_extract_text_from_pdf: PDFファイルからテキストを抽出する
     ・_extract_text_from_html: HTMLページからテキストを抽出する
     ・_format_text: テキストの標準化
-    ・_compare: 条文の比較
-    ・_content_in_target: コンテンツ部分が対象に含まれているかをチェックする
+    ・_compare: 条文の比較（全ての版の条文をまとめて比較し、条文IDごとの判定結果を返す）
     ・_header_in_target: ヘッダー部分が対象にに含まれているかをチェックする
     ・_validate_text: テキストに含まれるプレースホルダー部分を正規表現に置き換え、他の部分が変更されていないかを確認する（支援機関名にちゃんと代入されているかのチェック）
     """
-    def __init__(self, base_target_url, base_json_path='base.json'):
+    def __init__(self, base_target_url, base_json_path='base.json', max_depth=2, max_pages=30, max_bytes=None):
         self.base_target_url = base_target_url
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.max_bytes = dict(MAX_BYTES, **(max_bytes or {}))
+        self.fetch_stats = {'requests': 0, 'raw_bytes': 0, 'decoded_bytes': 0, 'aborted': 0}
+        # 巡回時に審査済みのURLと審査結果
+        self._page_judges = {}
         self.base_json_path = base_json_path
+        if isinstance(base_json_path, str):
+            self.base_json_paths = (base_json_path,)
+        else:
+            self.base_json_paths = tuple(base_json_path)
     
     def exam_execute(self):
         """
         審査を実行する
         """
-        #pdfもしくはhtmlからテキストを抽出
+        #遵守宣言の記載がありそうなurlを探す
         try:
             base_target_url = self.base_target_url
-            self.is_PDF = self._is_PDF(base_target_url)
-            if self.is_PDF:
+            if self._is_PDF(base_target_url):
                 target_url = base_target_url
-                raw_text = self._extract_text_from_pdf(target_url)
             else:
-                is_PDF, target_url = self._crawl_web(base_target_url)
-                if is_PDF:
-                    raw_text = self._extract_text_from_pdf(target_url)
-                else:
-                    raw_text = self._extract_text_from_html(target_url)
-        except TimeoutError:
-            #print(f"次のURLでテキスト抽出がタイムアウトしました。 url:{self.base_target_url}")
-            return "処理スキップ"
+                _, target_url = self._crawl_web(base_target_url)
         except Exception as e:
             #print(f"テキスト抽出時のエラー: {e}")
             return "テキスト抽出エラー"
 
-        # テキストの標準化
-        try:
-            formatted_text = self._format_text(raw_text)
-        except Exception as e:
-            #print(f"テキストの標準化中にエラーが発生しました: {e}")
-            return "テキスト標準化エラー"
-
-        # 条文の比較
-        try:
-            result = self._compare(formatted_text)
-        except Exception as e:
-            #print(f"条文の比較中にエラーが発生しました: {e}")
-            return "条文比較エラー"
-
-        return result
+        # 巡回時に審査済みであればその結果を使う
+        return self._one_url_execute(target_url)
     
     def exam_all_urls(self):
         links = self._get_links_from_base()
 
         OK_list = []
         defect_list = []
-        defect_number_list = []
+        defect_judges_list = []
+        OK_versions = []
         exception_list = []
         
         #print(f"審査対象のリンク数: {len(links)}")
@@ -89,12 +300,13 @@ class ExamTargetClass(object):
         for link in links: 
             #print(f"審査中: {link}")
             try:
-                status, defect_number = self._classify_one_url(link)
+                status, defect_judges, versions = self._classify_one_url(link)
                 if status == 1:
                     OK_list.append([link])
+                    OK_versions.extend(v for v in versions if v not in OK_versions)
                 elif status == 2:
                     defect_list.append([link])
-                    defect_number_list.append(defect_number)
+                    defect_judges_list.append(defect_judges)
                 else:
                     exception_list.append([link])
             except Exception as e:
@@ -103,46 +315,225 @@ class ExamTargetClass(object):
 
 
         final_status = 0
-        result = {"final_status": final_status, "links": None, "missing_clauses": None}
+        result = {"final_status": final_status, "links": None, "missing_clauses": None, "versions": None, "fetch_stats": None}
 
         if OK_list:
             result["final_status"] = 1
             result["links"] = [OK[0] for OK in OK_list]
+            result["versions"] = OK_versions
         elif defect_list:
             result["final_status"] = 2
-            min_defect_index = min(range(len(defect_number_list)), key=lambda x: len(defect_number_list[x]))
+            min_defect_index = min(range(len(defect_judges_list)), key=lambda x: len(defect_judges_list[x].missing_clause_ids()))
             result["links"] = defect_list[min_defect_index]
-            result["missing_clauses"] = defect_number_list[min_defect_index]
+            # 不足条文はClauseJudgesのまま返し、条文番号は書き出し時に条文インデックスから引く
+            result["missing_clauses"] = defect_judges_list[min_defect_index]
+            # 準拠している版はないため、versionsは空のままにする（比較した版はmissing_clausesのversion）
         else:
             result["final_status"] = 3
 
+        result["fetch_stats"] = dict(self.fetch_stats)
         return result
 
     def _get_links_from_base(self):
-        base_url = self.base_target_url
-        try:
-            # ベースURLのHTMLを取得
-            r = requests.get(base_url)
-            soup = BeautifulSoup(r.content, "html.parser")
-
-            # リンクを格納するリスト
-            links = [base_url]
-
-            # 全ての<a>タグを探索
-            for a in soup.find_all("a", href=True):
-                link = a.get("href")
-                # 相対リンクを絶対リンクに変換
-                full_url = urljoin(base_url, link)
-                # 有効なリンクか確認（スキームがあるもの）
-                parsed_url = urlparse(full_url)
-                if parsed_url.scheme in ["http", "https"]:
-                    links.append(full_url)
+        """
+        ベースURLから同一ホスト内を幅優先で巡回し、審査対象のリンクを返す
+        ・max_depth: ベースURLから何クリック先まで辿るか
+        ・max_pages: 審査対象として返すリンク数の上限（巡回でHTMLを取得するページもこの中に含まれる）
+        robots.txtで禁止されたURLは辿らず、sitemap.xmlに載っている遵守宣言らしいURLも候補に加える
+        """
+        return [link for link, _ in self._discover_links()]
 
-            return links
+    def _discover_links(self):
+        """
+        審査対象のリンクを(URL, 優先度)のリストとして巡回順に返す
+        遵守宣言らしいリンク（優先度が1以上）を先に、同じ条件なら浅い順、優先度の高い順に巡回する
+        """
+        base_url = self._normalize_url(self.base_target_url)
+        if not base_url:
+            return []
 
-        except requests.RequestException as e:
+        try:
+            # ベースURLのHTMLを取得
+            base_page = self._get_page_links(base_url)
+        except (requests.RequestException, ResponseTooLargeError, TimeoutError) as e:
             #print("Error fetching the page:", e)
             return []
+
+        robots = self._load_robots(base_url)
+
+        # 巡回待ちのURL: (遵守宣言らしくないか, 深さ, -優先度, 発見順, URL)
+        frontier = []
+        seen = {base_url}
+        order = 0
+
+        def push(url, text, depth):
+            nonlocal order
+            if url in seen or not self._is_same_host(url, base_url):
+                return
+            seen.add(url)
+            score = self._link_score(url, text)
+            heapq.heappush(frontier, (score == 0, depth, -score, order, url))
+            order += 1
+
+        # リンクを格納するリスト
+        links = [(base_url, 0)]
+        canonical_url, page_links = base_page
+        if canonical_url:
+            seen.add(canonical_url)
+        for url, text in page_links:
+            push(url, text, 1)
+        for url in self._get_sitemap_links(robots, base_url):
+            push(url, '', 1)
+
+        while frontier and len(links) < self.max_pages:
+            _, depth, negative_score, _, url = heapq.heappop(frontier)
+            if robots is not None and not robots.can_fetch('*', url):
+                continue
+
+            if depth < self.max_depth and not self._is_PDF(url):
+                try:
+                    canonical_url, page_links = self._get_page_links(url)
+                except (requests.RequestException, ResponseTooLargeError, TimeoutError):
+                    # 取得できなかったページ、5秒以内に取得、抽出できなかったページは審査対象にしない
+                    continue
+                if canonical_url and canonical_url != url:
+                    # 既に審査対象にしたページの別URLであれば重複として扱う
+                    if canonical_url in seen:
+                        self._page_judges.pop(url, None)
+                        continue
+                    seen.add(canonical_url)
+                for link, text in page_links:
+                    push(link, text, depth + 1)
+
+            links.append((url, -negative_score))
+
+        return links
+
+    def _get_page_links(self, url):
+        """
+        ページを取得し、canonical URLと(リンク先URL, リンク文字列)のリストを返す
+        取得したページはその場で審査して結果だけを_page_judgesに残し、審査時に再度ダウンロードしない
+        HTML以外のページはリンクなしとして扱う
+        """
+        try:
+            raw_text, soup = self._load_page(url)
+        except (requests.RequestException, ResponseTooLargeError, TimeoutError):
+            raise
+        except Exception:
+            # PDF、HTML以外のページや、テキスト抽出に失敗したページ
+            self._page_judges[url] = "テキスト抽出エラー"
+            return None, []
+        self._page_judges[url] = self._one_url_execute(url, raw_text)
+
+        if soup is None:
+            return None, []
+
+        canonical_url = None
+        canonical = soup.find("link", rel="canonical", href=True)
+        if canonical:
+            canonical_url = self._normalize_url(canonical.get("href"), url)
+
+        page_links = []
+        # 全ての<a>タグを探索
+        for a in soup.find_all("a", href=True):
+            # 相対リンクを絶対リンクに変換し、有効なリンク（スキームがあるもの）のみ残す
+            full_url = self._normalize_url(a.get("href"), url)
+            if full_url:
+                page_links.append((full_url, a.get_text(strip=True)))
+        return canonical_url, page_links
+
+    def _load_robots(self, base_url):
+        """
+        robots.txtを読み込む。取得できなかった場合はNoneを返す（巡回の制限なし）
+        """
+        robots_url = urljoin(base_url, '/robots.txt')
+        try:
+            with self._open_stream(robots_url) as r:
+                if r.status_code != 200:
+                    return None
+                content = self._read_body(r, self.max_bytes['robots'])
+        except (requests.RequestException, ResponseTooLargeError):
+            return None
+
+        robots = urllib.robotparser.RobotFileParser(robots_url)
+        robots.parse(content.decode('utf-8', errors='replace').splitlines())
+        return robots
+
+    def _get_sitemap_links(self, robots, base_url):
+        """
+        sitemap.xml（robots.txtのSitemap指定、なければ/sitemap.xml）から遵守宣言らしいURLを返す
+        サイトマップインデックスの場合は1階層だけ子のサイトマップを読む
+        読むサイトマップは同一ホストのもののみ、子のサイトマップも含めてMAX_SITEMAPS件まで
+        """
+        sitemap_urls = None
+        if robots is not None:
+            sitemap_urls = robots.site_maps()
+        if not sitemap_urls:
+            sitemap_urls = [urljoin(base_url, '/sitemap.xml')]
+
+        # 読み込み待ちのサイトマップ: (URL, 子のサイトマップか)
+        queue = [(self._normalize_url(url), False) for url in sitemap_urls]
+        read_count = 0
+        links = []
+        while queue and read_count < MAX_SITEMAPS:
+            sitemap_url, is_child = queue.pop(0)
+            if not sitemap_url or not self._is_same_host(sitemap_url, base_url):
+                continue
+            read_count += 1
+            for url in self._read_sitemap(sitemap_url):
+                if not self._is_same_host(url, base_url):
+                    continue
+                if urlparse(url).path.endswith('.xml'):
+                    if not is_child:
+                        queue.append((url, True))
+                elif self._link_score(url, '') > 0:
+                    links.append(url)
+
+        return links
+
+    def _read_sitemap(self, sitemap_url):
+        try:
+            with self._open_stream(sitemap_url) as r:
+                r.raise_for_status()
+                content = self._read_body(r, self.max_bytes['sitemap'])
+        except (requests.RequestException, ResponseTooLargeError):
+            return []
+        soup = BeautifulSoup(content, "html.parser")
+        urls = [self._normalize_url(loc.get_text(strip=True)) for loc in soup.find_all("loc")]
+        return [url for url in urls if url]
+
+    def _normalize_url(self, url, base_url=None):
+        """
+        URLを正規化する（フラグメントの除去、ホスト名の小文字化、既定ポートの除去）
+        base_urlを渡した場合は、相対リンクをbase_urlからの絶対リンクに変換してから正規化する
+        http, https以外のURLや、ポート番号などが不正なURLは空文字を返す
+        """
+        try:
+            if base_url:
+                url = urljoin(base_url, url)
+            parsed_url = urlparse(urldefrag(url)[0])
+            if parsed_url.scheme not in ["http", "https"] or not parsed_url.hostname:
+                return ''
+            port = parsed_url.port
+        except ValueError:
+            return ''
+        netloc = parsed_url.hostname
+        if port and port != {'http': 80, 'https': 443}[parsed_url.scheme]:
+            netloc += f":{port}"
+        return urlunparse((parsed_url.scheme, netloc, parsed_url.path or '/', parsed_url.params, parsed_url.query, ''))
+
+    def _is_same_host(self, url, base_url):
+        # www.の有無は同一ホストとして扱う
+        host = urlparse(url).netloc
+        base_host = urlparse(base_url).netloc
+        return host.removeprefix('www.') == base_host.removeprefix('www.')
+
+    def _link_score(self, url, text):
+        """
+        URLとリンク文字列から遵守宣言のページらしさを数値化する
+        """
+        target = (unquote(url) + ' ' + text).lower()
+        return sum(1 for keyword in DECLARATION_KEYWORDS if keyword in target)
         
     def _classify_one_url(self, url):
         """
@@ -150,42 +541,54 @@ class ExamTargetClass(object):
         1. 全てTrue
         2. ひとつ以上True（内容に不備がある）
         3. 全てFalse(おそらく遵守宣言のページやPDFではない)
+        版ごとに分類し、1の版があればその版を全て、なければ不足条文が最も少ない2の版を返す
         """
-        result = self._one_url_execute(url)
-        
-        
-        defect_number = []
-        status = 0
+        judges = self._one_url_execute(url)
+        if isinstance(judges, str):
+            # テキスト抽出などでエラーになった場合
+            return 3, None, []
 
+        index = load_guideline_index(self.base_json_paths)
+        defect_judges = None
+        min_missing = None
+        versions = []
+        status = 3
 
-        # resultは辞書のリストになっている
+
+        # judgesは条文IDを添字としたbytearrayになっている
         # 全てのjudgeがOKの場合、ひとつ以上OKの場合（全てではない）、全てNGの場合
-        # 1. 全てTrue
-        if all([r["judge"] for r in result]):
-            status = 1
-        # 2. ひとつ以上True
-        elif any([r["judge"] for r in result]):
-            # 不備の内容を出力
-            for r in result:
-                if not r["judge"]:
-                    defect_number.append(str(r["number"]))
-            status = 2
-        # 3. 全てFalse  
-        else:
-            status = 3
-        return status, defect_number
+        for version in index.versions:
+            missing = len(index.missing_clause_ids(version, judges))
+            # 1. 全てTrue
+            if missing == 0:
+                if status != 1:
+                    versions = []
+                    defect_judges = None
+                status = 1
+                versions.append(version)
+            # 2. ひとつ以上True
+            elif missing < len(index.version_clauses[version]) and status != 1:
+                # 不備の内容は条文IDの判定結果のまま保持する
+                if status == 3 or missing < min_missing:
+                    status = 2
+                    min_missing = missing
+                    defect_judges = ClauseJudges(self.base_json_paths, version, judges)
+                    versions = [version]
+        return status, defect_judges, versions
     
-    def _one_url_execute(self, target_url):
+    def _one_url_execute(self, target_url, raw_text=None):
         """
         審査を実行する
+        ・raw_text: 巡回時に抽出済みのテキスト。渡された場合は再度ダウンロードしない
+        巡回時に審査済みのURLは、その結果を返す
         """
+        if target_url in self._page_judges:
+            return self._page_judges.pop(target_url)
+
         #pdfもしくはhtmlからテキストを抽出
         try:
-            self.is_PDF = self._is_PDF(target_url)
-            if self.is_PDF:
-                raw_text = self._extract_text_from_pdf(target_url)
-            else:
-                raw_text = self._extract_text_from_html(target_url)
+            if raw_text is None:
+                raw_text = self._extract_text(target_url)
         except TimeoutError:
             #print(f"次のURLでテキスト抽出がタイムアウトしました。 url:{target_url}")
             return "処理スキップ"
@@ -210,8 +613,8 @@ class ExamTargetClass(object):
         return result
     
     def _is_PDF(self, file_path):
-        #拡張子で判定
-        if file_path.endswith('.pdf'):
+        #拡張子で判定（巡回時の目安。審査時の振り分けは_fetch_targetで内容から判定する）
+        if urlparse(file_path).path.lower().endswith('.pdf'):
             return True
         else:
             return False
@@ -219,16 +622,176 @@ class ExamTargetClass(object):
     def _crawl_web(self, base_target_url):
         """
         元々のurlから遵守宣言の記載のあるurlを返す
+        巡回したリンクのうち最も遵守宣言らしいもの（なければ元々のurl）を返す
         """
-        is_PDF = False
-        return is_PDF, base_target_url
+        target_url = base_target_url
+        max_score = 0
+        for link, score in self._discover_links():
+            if score > max_score:
+                target_url, max_score = link, score
+        is_PDF = self._is_PDF(target_url)
+        return is_PDF, target_url
+
+    def _extract_text(self, url):
+        """URLの内容の種類を判定し、PDFまたはHTMLからテキストを抽出する関数。
+
+        Args:
+            url: 審査対象のURL。
+
+        Returns:
+            PDFファイルまたはHTMLページのテキスト内容。
+        """
+        raw_text, _ = self._load_page(url)
+        return raw_text
 
     @timeout(5)
-    def _extract_text_from_pdf(self, url, reader='fitz'):
+    def _load_page(self, url):
+        """URLの内容を取得してテキストを抽出する関数。取得から抽出までをまとめて5秒で打ち切る。
+
+        HTMLは1回だけ解析し、巡回時のリンク抽出にも同じ解析結果を使う。
+
+        Args:
+            url: 取得するURL。
+
+        Returns:
+            (テキスト内容, 解析済みのHTML)。PDFの場合、解析済みのHTMLはNone。
+        """
+        kind, content, encoding = self._fetch_target(url)
+        self.is_PDF = kind == 'pdf'
+        if self.is_PDF:
+            return self._extract_text_from_pdf(content), None
+        else:
+            soup = BeautifulSoup(content.decode(encoding, errors='replace'), 'html.parser')
+            return self._extract_text_from_html(soup), soup
+
+    def _fetch_target(self, url, kinds=('pdf', 'html')):
+        """URLの内容をストリーミングで取得し、種類と文字コードを判定する関数。
+
+        Content-Typeと先頭のバイト列で種類を判定し、kindsに含まれない場合は
+        本文を取得せずに打ち切る（画像やzipなどをダウンロードしない）。
+        本文が種類ごとの最大バイト数を超える場合も、その時点で打ち切る。
+
+        Args:
+            url: 取得するURL。
+            kinds: 取得対象とする種類 ('pdf', 'html')。
+
+        Returns:
+            (種類, 本文のバイト列, 文字コード)。文字コードはHTMLの場合のみ。
+        """
+        with self._open_stream(url) as response:
+            response.raise_for_status()  # HTTPエラーが発生した場合は例外を発生させる
+
+            content_type = response.headers.get('Content-Type', '')
+            mime_type = content_type.split(';')[0].strip().lower()
+            if mime_type.startswith(SKIP_CONTENT_TYPES):
+                raise UnsupportedContentError(f"審査対象外のContent-Typeです: {content_type}")
+
+            # 先頭のバイト列で種類を判定してから残りを取得する
+            chunks = response.iter_content(chunk_size=SNIFF_SIZE)
+            head = next(chunks, b'')
+            self.fetch_stats['decoded_bytes'] += len(head)
+            kind = self._sniff_kind(mime_type, head)
+            if kind not in kinds:
+                raise UnsupportedContentError(f"審査対象外の内容です: {content_type}")
+            content = self._read_body(response, self.max_bytes[kind], chunks, head)
+
+        encoding = None
+        if kind == 'html':
+            encoding = self._detect_encoding(content_type, content)
+        return kind, content, encoding
+
+    @contextlib.contextmanager
+    def _open_stream(self, url):
+        """
+        本文を読み込まずにレスポンスを開く（本文は_read_bodyで上限付きで読み込む）
+        閉じる時に、受信したバイト数（圧縮されたままのバイト数）をfetch_statsのraw_bytesに記録する
+        """
+        self.fetch_stats['requests'] += 1
+        with requests.get(url, stream=True, timeout=10) as response:
+            try:
+                yield response
+            finally:
+                self.fetch_stats['raw_bytes'] += response.raw.tell()
+
+    def _read_body(self, response, max_bytes, chunks=None, head=b''):
+        """
+        レスポンスの本文をmax_bytesまで読み込み、展開後のバイト数をfetch_statsのdecoded_bytesに記録する
+        headには読み込み済み（記録済み）の先頭のバイト列を渡す
+        Content-Lengthまたは読み込んだバイト数がmax_bytesを超えた時点で打ち切り、ResponseTooLargeErrorを送出する
+        """
+        content_length = response.headers.get('Content-Length', '')
+        if content_length.isdigit() and int(content_length) > max_bytes:
+            self.fetch_stats['aborted'] += 1
+            raise ResponseTooLargeError(f"レスポンスが大きすぎます: {content_length} bytes")
+
+        if chunks is None:
+            chunks = response.iter_content(chunk_size=SNIFF_SIZE)
+
+        body = [head]
+        size = len(head)
+        for chunk in chunks:
+            size += len(chunk)
+            self.fetch_stats['decoded_bytes'] += len(chunk)
+            if size > max_bytes:
+                self.fetch_stats['aborted'] += 1
+                raise ResponseTooLargeError(f"レスポンスが大きすぎます: {max_bytes} bytesを超えました")
+            body.append(chunk)
+        return b''.join(body)
+
+    def _sniff_kind(self, mime_type, head):
+        """
+        Content-Typeと先頭のバイト列から'pdf'か'html'かを判定する。どちらでもなければNoneを返す
+        """
+        # %PDFのマジックナンバーは先頭1024バイト以内にあればよい
+        if b'%PDF-' in head[:1024]:
+            return 'pdf'
+        lowered_head = head[:1024].lstrip(b'\xef\xbb\xbf \t\r\n').lower()
+        if lowered_head.startswith((b'<!doctype html', b'<html', b'<head', b'<body', b'<!--', b'<?xml')) or b'<html' in lowered_head:
+            return 'html'
+        if mime_type == 'application/pdf':
+            return 'pdf'
+        if mime_type.startswith('text/') or mime_type == 'application/xhtml+xml':
+            return 'html'
+        return None
+
+    def _detect_encoding(self, content_type, content):
+        """
+        BOM、Content-Typeのcharset、metaタグのcharsetの順に文字コードを判定する
+        いずれも無いか正しくデコードできない場合は、UTF-8、Shift_JIS、EUC-JPを試す（バイトの範囲でEUC-JPを先に試す場合がある）
+        """
+        for bom, encoding in ((codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16')):
+            if content.startswith(bom):
+                return encoding
+
+        candidates = []
+        match = re.search(r'charset\s*=\s*["\']?([\w.:-]+)', content_type, re.IGNORECASE)
+        # ISO-8859-1などはサーバーの初期設定のまま送られていることが多いため信用しない
+        if match and match.group(1).lower() not in WEAK_CHARSETS:
+            candidates.append(match.group(1))
+        match = re.search(rb'<meta[^>]+charset\s*=\s*["\']?([\w.:-]+)', content[:4096], re.IGNORECASE)
+        if match:
+            candidates.append(match.group(1).decode('ascii'))
+        # EUC-JPの全角文字は0xA1以上のバイトだけで構成され、cp932の半角カナとしても読めてしまうため、
+        # 0x80〜0xA0のバイトを含まない場合はEUC-JPを先に試す（cp932のひらがな、漢字は0x80〜0x9Fのバイトを含む）
+        if re.search(rb'[\x80-\xa0]', content):
+            candidates.extend(['utf-8', 'cp932', 'euc_jp'])
+        else:
+            candidates.extend(['utf-8', 'euc_jp', 'cp932'])
+
+        for candidate in candidates:
+            encoding = ENCODING_ALIASES.get(candidate.lower(), candidate)
+            try:
+                content.decode(encoding)
+            except (LookupError, UnicodeDecodeError):
+                continue
+            return encoding
+        return 'utf-8'
+
+    def _extract_text_from_pdf(self, content, reader='fitz'):
         """PDFファイルからテキストを抽出する関数。
 
         Args:
-            pdf_path: PDFファイルのパス。
+            content: PDFファイルのバイト列。
             reader: PDFリーダーの選択 ('pdfminer', 'pypdf2', 'pdfplumber', 'fitz')。
 
         Returns:
@@ -236,22 +799,13 @@ class ExamTargetClass(object):
         """
 
         try:
-            # PDFファイルをURLからダウンロード
-            response = requests.get(url)
-            response.raise_for_status()  # エラーチェック
-
-            # 一時ファイルにPDFを保存
-            with tempfile.NamedTemporaryFile(suffix=".pdf") as temp_pdf:
-                temp_pdf.write(response.content)
-                temp_pdf.flush()  # データをディスクに書き込む
-
-                # 一時ファイルをfitzで開き、テキスト抽出
-                text = ''
-                doc = fitz.open(temp_pdf.name)
-                for page_num in range(doc.page_count):
-                    page = doc.load_page(page_num)
-                    text += page.get_text()
-                doc.close()
+            # バイト列をそのままfitzで開き、テキスト抽出
+            text = ''
+            doc = fitz.open(stream=content, filetype='pdf')
+            for page_num in range(doc.page_count):
+                page = doc.load_page(page_num)
+                text += page.get_text()
+            doc.close()
 
             return text
 
@@ -259,22 +813,16 @@ class ExamTargetClass(object):
             #print(f"オンラインPDFファイルのテキスト抽出に失敗しました: {e}")
             raise e
 
-    @timeout(5)
-    def _extract_text_from_html(self, url):
+    def _extract_text_from_html(self, soup):
         """HTMLページからテキストを抽出する関数。
 
         Args:
-            url: HTMLページのURL。
+            soup: 解析済みのHTMLページ。
 
         Returns:
             HTMLページのテキスト内容。
         """
         try:
-            response = requests.get(url)
-            response.encoding = 'utf-8' 
-            response.raise_for_status()  # HTTPエラーが発生した場合は例外を発生させる
-
-            soup = BeautifulSoup(response.content, 'html.parser')
             text = soup.get_text(separator='\n')  # HTMLからテキストを抽出し、改行で区切る
 
             return text
@@ -294,7 +842,10 @@ class ExamTargetClass(object):
         # 削除対象の文言リスト
         removal_phrases = [
             '(別紙1)HP掲載・顧客説明の際の参考資料',
-            '中小M&Aガイドライン(第3版)遵守の宣言について',
+        ]
+        # 削除対象の文言パターン（ガイドラインの版は問わない）
+        removal_patterns = [
+            re.compile(r'中小M&Aガイドライン\(第\d+版\)遵守の宣言について'),
         ]
 
         for line in lines:
@@ -302,7 +853,7 @@ class ExamTargetClass(object):
             line = line.replace(' ', '').replace('　', '').replace('．', '').replace('·', '').replace(' ', '').replace('・', '').replace('、', '').replace('。', '')
             line = ''.join(char for char in line if unicodedata.category(char)[0] != 'C')
             line= unicodedata.normalize('NFKC', line)
-            if not line or any(phrase == line for phrase in removal_phrases):
+            if not line or any(phrase == line for phrase in removal_phrases) or any(pattern.fullmatch(line) for pattern in removal_patterns):
                 continue  # 空行、削除対象の行はスキップ
             
             formatted_text += line
@@ -310,106 +861,20 @@ class ExamTargetClass(object):
         return formatted_text
 
     def _compare(self, target_text):
-        # jsonファイルの読み込み
-        json_path = self.base_json_path
-        with open(json_path, 'r', encoding='utf-8') as f:
-            base_guideline = json.load(f)
-
-        result_header = self._header_in_target(base_guideline['header'], target_text)
-        result_content = self._content_in_target(base_guideline['content'], target_text)
-
-        
-        combined_results = [result_header]  # headerをリストの先頭に
-        combined_results.extend(result_content)  # contentの要素を後ろに追加
+        # 全ての版の条文インデックスの読み込み
+        index = load_guideline_index(self.base_json_paths)
+
+        # 版をまたいで共通の条文は1回だけ比較し、条文IDを添字として判定結果を格納する
+        judges = bytearray(len(index.clause_texts))
+        for clause_id, clause_text in enumerate(index.clause_texts):
+            if clause_id in index.header_ids:
+                is_in_target = self._header_in_target(clause_text, target_text)['judge']
+            else:
+                is_in_target = clause_text in target_text
+            judges[clause_id] = is_in_target
 
-        return combined_results
+        return judges
 
-    def _content_in_target(self, base_items, target_text):
-        """
-        Checks if each content within base_items, including nested middle, small, and small-small levels, 
-        is included in the target_text.
-        """
-        results = []
-        
-        
-        for item in base_items:
-            # Check 'large' level content
-            number = item['large_number']
-            content_text = item['text']
-            is_in_target = content_text in target_text
-            results.append({'number': number, 'base_content': content_text, 'judge': is_in_target})
-            
-            # Check 'middle' level content if it exists
-            if 'middle_content' in item:
-                for middle_item in item['middle_content']:
-                    middle_number = middle_item['middle_number']
-                    middle_text = middle_item['middle_text']
-                    is_in_target = middle_text in target_text
-                    results.append({'number': f"{number}.{middle_number}", 'base_content': middle_text, 'judge': is_in_target})
-                    
-                    # Check 'small' level content if it exists
-                    if 'small_content' in middle_item:
-                        for small_item in middle_item['small_content']:
-                            if 'small_text' in small_item:
-                                small_number = small_item['small_number']
-                                small_text = small_item['small_text']
-                                is_in_target = small_text in target_text
-                                results.append({'number': f"{number}.{middle_number}.{small_number}", 'base_content': small_text, 'judge': is_in_target})
-                            
-                            # Check 'small-small' level content if it exists
-                            if 'small_small_content' in small_item:
-                                for small_small_item in small_item['small_small_content']:
-                                    if 'small_small_text' in small_small_item:
-                                        small_small_number = small_small_item['small_small_number']
-                                        small_small_text = small_small_item['small_small_text']
-                                        is_in_target = small_small_text in target_text
-                                        results.append({'number': f"{number}.{middle_number}.{small_number}.{small_small_number}", 'base_content': small_small_text, 'judge': is_in_target})
-            
-            # Check 'asterisk' content if it exists
-            if 'asterisk_content' in item:
-                for asterisk_item in item['asterisk_content']:
-                    if 'asterisk_text' in asterisk_item:
-                        asterisk_number = asterisk_item['asterisk_number']
-                        asterisk_text = asterisk_item['asterisk_text']
-                        is_in_target = asterisk_text in target_text
-                        results.append({'number': f"{number}*{asterisk_number}", 'base_content': asterisk_text, 'judge': is_in_target})
-
-            
-            # Check nested asterisk content in 'middle' level
-            if 'middle_content' in item:
-                for middle_item in item['middle_content']:
-                    if 'asterisk_content' in middle_item:
-                        for asterisk_item in middle_item['asterisk_content']:
-                            if 'asterisk_text' in asterisk_item:
-                                asterisk_number = f"{number}.{middle_item['middle_number']}*{asterisk_item['asterisk_number']}"
-                                asterisk_text = asterisk_item['asterisk_text']
-                                is_in_target = asterisk_text in target_text
-                                results.append({'number': asterisk_number, 'base_content': asterisk_text, 'judge': is_in_target})
-
-                    # Check nested asterisk content in 'small' level
-                    if 'small_content' in middle_item:
-                        for small_item in middle_item['small_content']:
-                            if 'asterisk_content' in small_item:
-                                for asterisk_item in small_item['asterisk_content']:
-                                    if 'asterisk_text' in asterisk_item:
-                                        asterisk_number = f"{number}.{middle_item['middle_number']}.{small_item['small_number']}*{asterisk_item['asterisk_number']}"
-                                        asterisk_text = asterisk_item['asterisk_text']
-                                        is_in_target = asterisk_text in target_text
-                                        results.append({'number': asterisk_number, 'base_content': asterisk_text, 'judge': is_in_target})
-
-                            # Check nested asterisk content in 'small-small' level
-                            if 'small_small_content' in small_item:
-                                for small_small_item in small_item['small_small_content']:
-                                    if 'asterisk_content' in small_small_item:
-                                        for asterisk_item in small_small_item['asterisk_content']:
-                                            if 'asterisk_text' in asterisk_item:
-                                                asterisk_number = f"{number}.{middle_item['middle_number']}.{small_item['small_number']}.{small_small_item['small_small_number']}*{asterisk_item['asterisk_number']}"
-                                                asterisk_text = asterisk_item['asterisk_text']
-                                                is_in_target = asterisk_text in target_text
-                                                results.append({'number': asterisk_number, 'base_content': asterisk_text, 'judge': is_in_target})
-        
-        return results
-   
     def _header_in_target(self, base_header, target_text):
         """
         base_itemsの各contentがtarget_textに含まれているかをチェックする関数
@@ -1,4 +1,4 @@
-from exam_class import ExamTargetClass
+from exam_class import ExamTargetClass, ClauseJudges
 import openpyxl
 import concurrent.futures
 import warnings
@@ -9,6 +9,17 @@ import csv
 # XMLParsedAsHTMLWarningを無視する
 warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
 
+# 審査に使う遵守宣言原本のjson（ガイドライン改訂の移行期間中は新旧の版を並べる）
+BASE_JSON_PATHS = ['base.json']
+
+def resolve_missing_clauses(missing_clauses):
+    """
+    ClauseJudgesで返された不足条文を条文番号のリストに変換する
+    """
+    if isinstance(missing_clauses, ClauseJudges):
+        return missing_clauses.missing_numbers()
+    return missing_clauses
+
 def save_intermediate_results(table, csv_path='intermediate_results.csv'):
     """
     中間結果をCSVに保存します。元の行番号と結果を合わせて保存し、再開時の整合性を保ちます。
@@ -17,12 +28,12 @@ def save_intermediate_results(table, csv_path='intermediate_results.csv'):
         writer = csv.writer(file)
         
         # ヘッダーの書き込み（元のテーブルの列と追加する列）
-        writer.writerow(table[0] + ["審査結果", "正解URL", "不足条文"])  # ヘッダー行を保持
+        writer.writerow(table[0] + ["審査結果", "正解URL", "不足条文", "準拠版"])  # ヘッダー行を保持
         
         # 各行を保存
         for row in table[1:]:  # ヘッダーを除いたデータ部分
             processed_row = [
-                str(item) if item is not None else "" for item in row
+                str(resolve_missing_clauses(item)) if item is not None else "" for item in row
             ]
             writer.writerow(processed_row)
 
@@ -32,7 +43,7 @@ def system_validate(xlsx_path, new_xlsx_path):
     # エクセルをテーブルデータとして読み込む
     # 遵守事項掲載URLの列を取得
     # そのURLでone_testを実行
-    # 審査結果をテーブルデータに追加（審査結果、正解URL、不足条文の3列を追加）
+    # 審査結果をテーブルデータに追加（審査結果、正解URL、不足条文、準拠版の4列を追加）
     # 追加部分を複製したエクセルに書き込む
     '''
     # メイン処理
@@ -60,8 +71,7 @@ def get_url_column(table):
 
 # そのURLでone_testを実行
 def test_url(url):
-    base_json_path = 'base.json'
-    exam = ExamTargetClass(url, base_json_path)
+    exam = ExamTargetClass(url, BASE_JSON_PATHS)
     result = exam.exam_all_urls()
     final_status = result["final_status"]
     print("url: ", url)
@@ -74,10 +84,11 @@ def test_url(url):
     else:
         result["final_status"] = '閲覧不可・動線不明'
         print("審査結果：閲覧不可・動線不明")
+    print("通信量:", result["fetch_stats"])
     print("=====================================")
     return result
 
-# 審査結果をテーブルデータに追加（審査結果、正解URL、不足条文の3列を追加）
+# 審査結果をテーブルデータに追加（審査結果、正解URL、不足条文、準拠版の4列を追加）
 """
 def add_result_to_table(table, url_column):
     #for i in range(1, len(table)):
@@ -101,21 +112,22 @@ def process_url(url):
     if not url:
         print("URLが空欄です")
         print("=====================================")
-        return {"final_status": None, "links": None, "missing_clauses": None}
+        return {"final_status": None, "links": None, "missing_clauses": None, "versions": None, "fetch_stats": None}
     
     try:
         # タイムアウトを5秒に設定
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()  # ステータスコードが200以外なら例外を発生
+        # 本文は読み込まずにステータスコードだけ確認する（大きなファイルへのリンクでもメモリを使わない）
+        with requests.get(url, stream=True, timeout=10) as response:
+            response.raise_for_status()  # ステータスコードが200以外なら例外を発生
 
         # 審査を行う
         result = test_url(url)
     except requests.exceptions.Timeout:
         print(f"URL {url} の処理がタイムアウトしました")
-        return {"final_status": "Timeout", "links": None, "missing_clauses": None}
+        return {"final_status": "Timeout", "links": None, "missing_clauses": None, "versions": None, "fetch_stats": None}
     except requests.exceptions.RequestException as e:
         print(f"URL {url} のリクエスト中にエラーが発生しました: {e}")
-        return {"final_status": "Error", "links": None, "missing_clauses": None}
+        return {"final_status": "Error", "links": None, "missing_clauses": None, "versions": None, "fetch_stats": None}
 
     return result
 
@@ -132,22 +144,29 @@ def add_result_to_table(table, url_column):
                 results.append(result)
             except concurrent.futures.TimeoutError:
                 print(f"URL {url} の処理がタイムアウトしました")
-                results.append({"final_status": "Timeout", "links": None, "missing_clauses": None})
+                results.append({"final_status": "Timeout", "links": None, "missing_clauses": None, "versions": None, "fetch_stats": None})
             except Exception as e:
                 print(f"URL {url} の処理中にエラーが発生しました: {e}")
                 # 結果が取得できなかった場合にNoneなどで代用
-                results.append({"final_status": "Error", "links": [], "missing_clauses": []})
+                results.append({"final_status": "Error", "links": [], "missing_clauses": [], "versions": [], "fetch_stats": None})
 
                 table[i] += (result["final_status"], result["links"], result["missing_clauses"])
                 save_intermediate_results(table)
 
     # 結果をテーブルに追加
+    total_bytes = 0
+    aborted = 0
     for i, result in enumerate(results, start=1):
+        if result.get("fetch_stats"):
+            total_bytes += result["fetch_stats"]["raw_bytes"]
+            aborted += result["fetch_stats"]["aborted"]
         final_status = result["final_status"]
         links = result["links"]
         missing_clauses = result["missing_clauses"]
-        table[i] += (final_status, links, missing_clauses)
-        print("審査結果:", final_status, "リンク:", links, "不足条文:", missing_clauses)
+        versions = result["versions"]
+        table[i] += (final_status, links, missing_clauses, versions)
+        print("審査結果:", final_status, "リンク:", links, "不足条文:", resolve_missing_clauses(missing_clauses), "準拠版:", versions)
+    print("通信量合計:", total_bytes, "bytes（受信）", "サイズ超過で打ち切ったレスポンス数:", aborted)
 
     return table
 
@@ -168,7 +187,9 @@ def write_xlsx(table, xlsx_path):
         return flat_list
 
     for row in table:
-        # ワークシートの8-10列目を明示的に指定して審査結果、正解URL、不足条文を追加
+        # ワークシートの8-11列目を明示的に指定して審査結果、正解URL、不足条文、準拠版を追加
+        # 不足条文はここで初めて条文番号に変換する
+        row = [resolve_missing_clauses(item) for item in row]
         processed_row = [
             ",".join(flatten_list(item)) if isinstance(item, list) else item for item in row
         ]
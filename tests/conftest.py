@@ -0,0 +1,117 @@
+import os
+import sys
+import json
+import time
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from exam_class import ExamTargetClass, iter_clauses
+
+BASE_JSON_PATH = os.path.join(REPO_DIR, 'base', 'base.json')
+
+
+class FixtureRequestHandler(SimpleHTTPRequestHandler):
+    """
+    テスト用のサイトのファイルを返すハンドラ
+    ・/stream/<バイト数>: Content-Lengthなしで指定バイト数のHTMLを返す
+    ・/slow/<秒数>: 指定秒数の間、0.1秒ごとに1バイトずつHTMLを返す
+    """
+    def do_GET(self):
+        self.server.request_log.append(self.path)
+        if self.path.startswith('/stream/'):
+            size = int(self.path.split('/')[-1])
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.end_headers()
+            self.wfile.write(b'<html>' + b'a' * size)
+            self.close_connection = True
+            return
+        if self.path.startswith('/slow/'):
+            seconds = float(self.path.split('/')[-1])
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.end_headers()
+            self.close_connection = True
+            try:
+                self.wfile.write(b'<html>')
+                for _ in range(int(seconds * 10)):
+                    time.sleep(0.1)
+                    self.wfile.write(b'a')
+                    self.wfile.flush()
+            except OSError:
+                pass
+            return
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureSite(object):
+    """
+    一時ディレクトリをルートとするテスト用のサイト
+    ・root: サイトのルートディレクトリ
+    ・request_log: 受け付けたリクエストのパスのリスト
+    """
+    def __init__(self, root, server):
+        self.root = root
+        self.server = server
+        self.request_log = server.request_log
+        self.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def url(self, path='/'):
+        return self.base_url + path
+
+    def write(self, path, content, encoding='utf-8'):
+        file_path = os.path.join(self.root, path.lstrip('/'))
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        if isinstance(content, str):
+            content = content.encode(encoding)
+        with open(file_path, 'wb') as f:
+            f.write(content)
+
+    def requested(self, path):
+        return self.request_log.count(path)
+
+
+@pytest.fixture
+def fixture_site(tmp_path):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(FixtureRequestHandler, directory=str(tmp_path)))
+    server.request_log = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield FixtureSite(str(tmp_path), server)
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def base_json_path():
+    return BASE_JSON_PATH
+
+
+@pytest.fixture
+def exam_for(fixture_site, base_json_path):
+    """
+    テスト用のサイトのルートを審査対象とするExamTargetClassを作成する関数
+    """
+    def make(**kwargs):
+        return ExamTargetClass(fixture_site.url('/'), base_json_path, **kwargs)
+    return make
+
+
+@pytest.fixture
+def declaration_text():
+    """
+    原本の全ての条文を含み、支援機関名を代入した遵守宣言の本文
+    """
+    with open(BASE_JSON_PATH, 'r', encoding='utf-8') as f:
+        base_guideline = json.load(f)
+    header = base_guideline['header'].replace('(M&A支援機関名)', 'テスト株式会社')
+    return '\n'.join([header] + [text for _, text in iter_clauses(base_guideline['content'])])
@@ -0,0 +1,158 @@
+import time
+
+import exam_class
+from exam_class import MAX_SITEMAPS
+
+
+def page(*links, head=''):
+    anchors = ''.join(f'<a href="{href}">{text}</a>' for href, text in links)
+    return f'<html><head>{head}</head><body>{anchors}</body></html>'
+
+
+def test_declaration_two_clicks_away_is_found(fixture_site, exam_for, declaration_text):
+    fixture_site.write('/index.html', page(('/about/', '会社概要')))
+    fixture_site.write('/about/index.html', page(('/about/policy.html', '中小M&Aガイドライン遵守の宣言')))
+    fixture_site.write('/about/policy.html', f'<html><body><p>{declaration_text}</p></body></html>')
+
+    result = exam_for().exam_all_urls()
+
+    assert result['final_status'] == 1
+    assert result['links'] == [fixture_site.url('/about/policy.html')]
+    assert result['versions'] == ['第3版']
+
+
+def test_max_depth_limits_crawl(fixture_site, exam_for):
+    fixture_site.write('/index.html', page(('/about/', '会社概要')))
+    fixture_site.write('/about/index.html', page(('/about/policy.html', '遵守宣言')))
+
+    links = exam_for(max_depth=1)._get_links_from_base()
+
+    assert links == [fixture_site.url('/'), fixture_site.url('/about/')]
+    assert fixture_site.requested('/about/') == 0
+
+
+def test_max_pages_limits_links(fixture_site, exam_for):
+    fixture_site.write('/index.html', page(*[(f'/news/{i}.html', f'お知らせ{i}') for i in range(20)]))
+    for i in range(20):
+        fixture_site.write(f'/news/{i}.html', page())
+
+    links = exam_for(max_pages=5)._get_links_from_base()
+
+    assert len(links) == 5
+    assert sum(fixture_site.requested(f'/news/{i}.html') for i in range(20)) <= 4
+
+
+def test_declaration_like_links_are_visited_first(fixture_site, exam_for):
+    fixture_site.write('/index.html', page(
+        ('/news/1.html', 'お知らせ'),
+        ('/company.html', '会社概要'),
+        ('/sengen.html', 'ガイドライン遵守宣言'),
+    ))
+    for path in ['/news/1.html', '/company.html', '/sengen.html']:
+        fixture_site.write(path, page())
+
+    links = exam_for()._get_links_from_base()
+
+    assert links[:2] == [fixture_site.url('/'), fixture_site.url('/sengen.html')]
+
+
+def test_robots_disallow_and_other_hosts_are_not_crawled(fixture_site, exam_for):
+    fixture_site.write('/robots.txt', 'User-agent: *\nDisallow: /private/\n')
+    fixture_site.write('/index.html', page(
+        ('/private/sengen.html', '遵守宣言'),
+        ('https://other.example/sengen.html', '遵守宣言'),
+        ('mailto:info@example.com', 'お問い合わせ'),
+        ('/about.html#top', '会社概要'),
+    ))
+    fixture_site.write('/private/sengen.html', page())
+    fixture_site.write('/about.html', page())
+
+    links = exam_for()._get_links_from_base()
+
+    assert links == [fixture_site.url('/'), fixture_site.url('/about.html')]
+    assert fixture_site.requested('/private/sengen.html') == 0
+
+
+def test_malformed_links_are_ignored(fixture_site, exam_for):
+    fixture_site.write('/index.html', page(
+        ('http://example.com:8o/', '不正なポート'),
+        ('http://example.com:99999/', '範囲外のポート'),
+        ('http://[::1/', '不正なホスト'),
+        ('/about.html', '会社概要'),
+    ))
+    fixture_site.write('/about.html', page())
+
+    links = exam_for()._get_links_from_base()
+
+    assert links == [fixture_site.url('/'), fixture_site.url('/about.html')]
+    assert exam_for().exam_all_urls()['final_status'] == 3
+
+def test_canonical_duplicates_are_dropped(fixture_site, exam_for):
+    fixture_site.write('/index.html', page(('/about/', '会社概要'), ('/about/index.html?from=top', '会社概要')))
+    fixture_site.write('/about/index.html', page(head=f'<link rel="canonical" href="{fixture_site.url("/about/")}">'))
+
+    links = exam_for()._get_links_from_base()
+
+    assert links == [fixture_site.url('/'), fixture_site.url('/about/')]
+
+
+def test_crawled_pages_are_downloaded_once(fixture_site, exam_for, declaration_text):
+    fixture_site.write('/index.html', page(('/about/', '会社概要'), ('/sengen.pdf', '遵守宣言')))
+    fixture_site.write('/about/index.html', page(('/about/policy.html', '遵守宣言')))
+    fixture_site.write('/about/policy.html', f'<html><body><p>{declaration_text}</p></body></html>')
+    fixture_site.write('/sengen.pdf', b'not a pdf')
+
+    exam_for().exam_all_urls()
+
+    for path in ['/', '/about/', '/about/policy.html', '/sengen.pdf']:
+        assert fixture_site.requested(path) == 1, path
+
+
+def test_crawled_pages_are_parsed_once(fixture_site, exam_for, declaration_text, monkeypatch):
+    fixture_site.write('/index.html', page(('/about/', '会社概要')))
+    fixture_site.write('/about/index.html', page(('/about/policy.html', '遵守宣言')))
+    fixture_site.write('/about/policy.html', f'<html><body><p>{declaration_text}</p></body></html>')
+    parsed = []
+
+    def counting_soup(markup, *args, **kwargs):
+        parsed.append(markup)
+        return original_soup(markup, *args, **kwargs)
+
+    original_soup = exam_class.BeautifulSoup
+    monkeypatch.setattr(exam_class, 'BeautifulSoup', counting_soup)
+
+    assert exam_for().exam_all_urls()['final_status'] == 1
+    # サイトマップなし: ベースURL、/about/、/about/policy.html の3ページを1回ずつ
+    assert len(parsed) == 3
+
+def test_sitemap_links_are_used_and_sitemap_fetches_are_bounded(fixture_site, exam_for):
+    other_host = fixture_site.url('/').replace('127.0.0.1', 'localhost')
+    fixture_site.write('/index.html', page())
+    fixture_site.write('/sitemap.xml', '<?xml version="1.0"?><sitemapindex>'
+        + f'<sitemap><loc>{other_host}other.xml</loc></sitemap>'
+        + ''.join(f'<sitemap><loc>{fixture_site.url(f"/sitemap-{i}.xml")}</loc></sitemap>' for i in range(20))
+        + '</sitemapindex>')
+    for i in range(20):
+        fixture_site.write(f'/sitemap-{i}.xml', '<?xml version="1.0"?><urlset>'
+            + f'<url><loc>{fixture_site.url(f"/compliance/{i}.html")}</loc></url>'
+            + f'<url><loc>{fixture_site.url(f"/news/{i}.html")}</loc></url>'
+            + '</urlset>')
+
+    links = exam_for(max_depth=1)._get_links_from_base()
+
+    assert fixture_site.url('/compliance/0.html') in links
+    assert fixture_site.url('/news/0.html') not in links
+    assert fixture_site.requested('/other.xml') == 0
+    sitemap_requests = [path for path in fixture_site.request_log if path.endswith('.xml')]
+    assert len(sitemap_requests) == MAX_SITEMAPS
+
+
+def test_slow_pages_are_skipped_within_the_time_limit(fixture_site, exam_for):
+    fixture_site.write('/index.html', page(('/slow/30', '遵守宣言'), ('/about.html', '会社概要')))
+    fixture_site.write('/about.html', page())
+
+    started = time.monotonic()
+    links = exam_for()._get_links_from_base()
+
+    assert time.monotonic() - started < 15
+    assert links == [fixture_site.url('/'), fixture_site.url('/about.html')]
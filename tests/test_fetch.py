@@ -0,0 +1,104 @@
+import fitz
+import pytest
+
+from exam_class import ExamTargetClass, UnsupportedContentError, ResponseTooLargeError, SNIFF_SIZE
+
+
+def make_pdf(text):
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), text)
+    content = doc.tobytes()
+    doc.close()
+    return content
+
+
+@pytest.mark.parametrize('path, content, expected_encoding', [
+    ('/sjis.html', '<html><head><meta charset="Shift_JIS"></head><body>遵守宣言①</body></html>'.encode('cp932'), 'cp932'),
+    ('/euc.html', '<html><body>遵守の宣言について</body></html>'.encode('euc_jp'), 'euc_jp'),
+    ('/bom.html', '﻿<html><body>ガイドライン</body></html>'.encode('utf-8'), 'utf-8-sig'),
+    ('/utf8.html', '<html><body>宣言</body></html>'.encode('utf-8'), 'utf-8'),
+    ('/euc-kana.html', '<html><body>ありがとうございます</body></html>'.encode('euc_jp'), 'euc_jp'),
+    ('/sjis-kana.html', '<html><body>ありがとうございます</body></html>'.encode('cp932'), 'cp932'),
+    ('/sjis-halfwidth.html', '<html><body>遵守宣言ｶﾞｲﾄﾞﾗｲﾝ</body></html>'.encode('cp932'), 'cp932'),
+])
+def test_html_encoding_is_detected(fixture_site, exam_for, path, content, expected_encoding):
+    fixture_site.write(path, content)
+    exam = exam_for()
+
+    kind, _, encoding = exam._fetch_target(fixture_site.url(path))
+
+    assert kind == 'html'
+    assert encoding == expected_encoding
+    assert content.decode(expected_encoding).split('<body>')[1].split('</body>')[0] in exam._extract_text(fixture_site.url(path))
+
+
+def test_content_type_charset_is_used_unless_it_is_a_server_default():
+    exam = ExamTargetClass('http://127.0.0.1/')
+    content = '<html><body>遵守宣言</body></html>'.encode('cp932')
+
+    assert exam._detect_encoding('text/html; charset=Shift_JIS', content) == 'cp932'
+    assert exam._detect_encoding('text/html; charset=ISO-8859-1', content) == 'cp932'
+
+
+def test_extensionless_pdf_is_sent_to_pdf_extractor(fixture_site, exam_for):
+    fixture_site.write('/download', make_pdf('Hello PDF'))
+    exam = exam_for()
+
+    kind, _, _ = exam._fetch_target(fixture_site.url('/download'))
+
+    assert kind == 'pdf'
+    assert 'Hello PDF' in exam._extract_text(fixture_site.url('/download'))
+    assert exam.is_PDF
+
+
+def test_image_is_skipped_before_body_is_downloaded(fixture_site, exam_for):
+    fixture_site.write('/photo.png', b'\x89PNG\r\n\x1a\n' + b'\0' * 1024 * 1024)
+    exam = exam_for()
+
+    with pytest.raises(UnsupportedContentError):
+        exam._fetch_target(fixture_site.url('/photo.png'))
+    assert exam.fetch_stats['decoded_bytes'] < 64 * 1024
+    assert exam._one_url_execute(fixture_site.url('/photo.png')) == "テキスト抽出エラー"
+
+
+def test_sniffed_bytes_are_counted_when_content_is_rejected(fixture_site, exam_for):
+    fixture_site.write('/archive', b'\x00\x01' * (64 * 1024))
+    exam = exam_for()
+
+    with pytest.raises(UnsupportedContentError):
+        exam._fetch_target(fixture_site.url('/archive'))
+    assert exam.fetch_stats['decoded_bytes'] == SNIFF_SIZE
+    assert exam.fetch_stats['raw_bytes'] >= SNIFF_SIZE
+    assert exam.fetch_stats['requests'] == 1
+
+def test_body_over_content_length_limit_is_not_read(fixture_site, exam_for):
+    fixture_site.write('/big.html', b'<html>' + b'a' * (2 * 1024 * 1024))
+    exam = exam_for(max_bytes={'html': 1024 * 1024})
+
+    with pytest.raises(ResponseTooLargeError):
+        exam._fetch_target(fixture_site.url('/big.html'))
+    assert exam.fetch_stats['aborted'] == 1
+    assert exam.fetch_stats['decoded_bytes'] <= SNIFF_SIZE
+
+
+def test_streamed_body_over_limit_is_aborted(fixture_site, exam_for):
+    exam = exam_for(max_bytes={'html': 1024 * 1024})
+
+    with pytest.raises(ResponseTooLargeError):
+        exam._fetch_target(fixture_site.url(f'/stream/{2 * 1024 * 1024}'))
+    assert exam.fetch_stats['aborted'] == 1
+    assert exam.fetch_stats['decoded_bytes'] <= 1024 * 1024 + SNIFF_SIZE
+
+    assert exam._fetch_target(fixture_site.url('/stream/1000'))[0] == 'html'
+
+
+def test_oversized_pages_do_not_stop_the_crawl(fixture_site, exam_for):
+    fixture_site.write('/index.html', '<html><body><a href="/big.html">遵守宣言</a><a href="/about.html">会社概要</a></body></html>')
+    fixture_site.write('/big.html', b'<html>' + b'a' * (6 * 1024 * 1024))
+    fixture_site.write('/about.html', '<html><body></body></html>')
+
+    result = exam_for().exam_all_urls()
+
+    assert result['final_status'] == 3
+    assert exam_for()._get_links_from_base() == [fixture_site.url('/'), fixture_site.url('/about.html')]
+    assert exam_for(max_bytes={'html': 10}).exam_all_urls()['final_status'] == 3
@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from exam_class import ExamTargetClass, GuidelineIndex, ClauseJudges, iter_clauses
+
+CHANGED_CLAUSE = '契約上の義務を負うかにかかわらず職業倫理として依頼者の意思を尊重し利益を最大化するための対応を行います'
+
+
+@pytest.fixture
+def editions(tmp_path, base_json_path):
+    """
+    第3版（原本）と、ヘッダーと条文2を変更した第4版のjsonのパス
+    """
+    with open(base_json_path, 'r', encoding='utf-8') as f:
+        base_guideline = json.load(f)
+    base_guideline['version'] = '第4版'
+    base_guideline['header'] = base_guideline['header'].replace('第3版', '第4版').replace('令和6年8月', '令和8年4月')
+    assert base_guideline['content'][1]['large_number'] == 2
+    base_guideline['content'][1]['text'] = CHANGED_CLAUSE
+
+    fourth_json_path = tmp_path / 'base_4.json'
+    with open(fourth_json_path, 'w', encoding='utf-8') as f:
+        json.dump(base_guideline, f, ensure_ascii=False)
+    return base_json_path, str(fourth_json_path)
+
+
+def declaration(json_path):
+    with open(json_path, 'r', encoding='utf-8') as f:
+        base_guideline = json.load(f)
+    header = base_guideline['header'].replace('(M&A支援機関名)', 'テスト株式会社')
+    return '\n'.join([header] + [text for _, text in iter_clauses(base_guideline['content'])])
+
+
+def classify(exam, text):
+    exam._one_url_execute = lambda url: exam._compare(exam._format_text(text))
+    return exam._classify_one_url('http://127.0.0.1/')
+
+
+def test_editions_share_clause_ids(editions):
+    third, fourth = GuidelineIndex(editions[:1]), GuidelineIndex(editions)
+
+    assert third.versions == ['第3版']
+    assert fourth.versions == ['第3版', '第4版']
+    # 第4版で増えるのは、変更したヘッダーと条文2だけ
+    assert len(fourth.clause_texts) == len(third.clause_texts) + 2
+    shared = [clause_id for (_, clause_id), (_, other_id) in zip(fourth.version_clauses['第3版'], fourth.version_clauses['第4版']) if clause_id == other_id]
+    assert len(shared) == len(fourth.version_clauses['第3版']) - 2
+
+
+@pytest.mark.parametrize('edition_index, expected_version', [(0, '第3版'), (1, '第4版')])
+def test_page_complies_with_one_edition(editions, edition_index, expected_version):
+    exam = ExamTargetClass('http://127.0.0.1/', list(editions))
+
+    status, defect_judges, versions = classify(exam, declaration(editions[edition_index]))
+
+    assert status == 1
+    assert defect_judges is None
+    assert versions == [expected_version]
+
+
+def test_missing_clauses_are_reported_per_edition(editions):
+    exam = ExamTargetClass('http://127.0.0.1/', list(editions))
+    # 第3版のヘッダーで、条文2が第4版の文言になっているページ
+    with open(editions[0], 'r', encoding='utf-8') as f:
+        original_clause = json.load(f)['content'][1]['text']
+    text = declaration(editions[0]).replace(original_clause, CHANGED_CLAUSE)
+
+    judges = exam._compare(exam._format_text(text))
+    third = ClauseJudges(exam.base_json_paths, '第3版', judges)
+    fourth = ClauseJudges(exam.base_json_paths, '第4版', judges)
+    assert third.missing_numbers() == ['2']
+    assert fourth.missing_numbers() == ['0']
+
+    exam._get_links_from_base = lambda: ['http://127.0.0.1/']
+    exam._one_url_execute = lambda url: exam._compare(exam._format_text(text))
+    result = exam.exam_all_urls()
+    assert result['final_status'] == 2
+    # 不備のあるページは準拠版なし
+    assert result['versions'] is None
+    assert result['missing_clauses'].version == '第3版'
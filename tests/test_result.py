@@ -0,0 +1,46 @@
+import json
+import pickle
+
+import openpyxl
+
+from exam_class import ExamTargetClass, ClauseJudges, iter_clauses
+from system_validate import resolve_missing_clauses, write_xlsx
+
+
+def defect_result(base_json_path):
+    """
+    最後の3条文（40〜42）が欠けたページの審査結果
+    """
+    with open(base_json_path, 'r', encoding='utf-8') as f:
+        base_guideline = json.load(f)
+    header = base_guideline['header'].replace('(M&A支援機関名)', 'テスト株式会社')
+    clauses = [text for _, text in iter_clauses(base_guideline['content'])]
+    text = '\n'.join([header] + clauses[:-3])
+
+    exam = ExamTargetClass('http://127.0.0.1/', base_json_path)
+    exam._get_links_from_base = lambda: ['http://127.0.0.1/']
+    exam._one_url_execute = lambda url: exam._compare(exam._format_text(text))
+    return exam.exam_all_urls()
+
+
+def test_missing_clauses_survive_pickling(base_json_path):
+    result = pickle.loads(pickle.dumps(defect_result(base_json_path)))
+
+    missing_clauses = result['missing_clauses']
+    assert isinstance(missing_clauses, ClauseJudges)
+    assert missing_clauses.base_json_paths == (base_json_path,)
+    assert missing_clauses.version == '第3版'
+    # 条文ごとの辞書のリストで審査していた時と同じ条文番号
+    assert missing_clauses.missing_numbers() == ['40', '41', '42']
+    assert resolve_missing_clauses(missing_clauses) == ['40', '41', '42']
+
+
+def test_write_xlsx_resolves_missing_clauses(tmp_path, base_json_path):
+    result = defect_result(base_json_path)
+    table = [('URL', '審査結果', '正解URL', '不足条文', '準拠版'), ('http://127.0.0.1/', '内容不備あり', result['links'], result['missing_clauses'], result['versions'])]
+    xlsx_path = tmp_path / 'after.xlsx'
+
+    write_xlsx(table, xlsx_path)
+
+    ws = openpyxl.load_workbook(xlsx_path).active
+    assert [cell.value for cell in ws[2]] == ['http://127.0.0.1/', '内容不備あり', 'http://127.0.0.1/', '40,41,42', None]